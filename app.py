@@ -1,4 +1,11 @@
+import threading
+import time
+from collections import deque
+
+import numba as nb
+import numexpr as ne
 import numpy as np
+import pyfftw
 import pyqtgraph as pg
 from PyQt6.QtWidgets import (
     QMainWindow,
@@ -9,26 +16,182 @@ from PyQt6.QtWidgets import (
     QPushButton,
 )
 from PyQt6.QtGui import QPixmap
-from PyQt6.QtCore import Qt, QUrl, QTimer
+from PyQt6.QtCore import Qt, QUrl, QTimer, QObject, QThread, pyqtSignal
 from PyQt6.QtMultimedia import QSoundEffect
 from hackrf import *
-from scipy.signal import welch
 
 # Constants for signal analysis
-FREQUENCY = 2.4e9  # 2.4 GHz for common drone frequency
+FREQUENCY = 2_400_000_000  # 2.4 GHz for common drone frequency
 SAMPLE_RATE = 10e6  # 10 MHz
 BUFFER_SIZE = 8192  # Buffer size for HackRF data
 THRESHOLD_POWER = -50  # Power threshold for drone detection in dB
 SWEEP_REFRESH_RATE = 30  # Refresh rate in Hz
+SLIDER_DEBOUNCE_MS = 50  # Settle time before acting on slider drags
+FFT_THREADS = 2  # Threads used by the FFTW plan
+IQ_SCALE = np.float32(1 / 128)  # HackRF delivers signed 8-bit I/Q
 
 # Define frequency range for sliders
-FREQ_MIN = 1e9  # Minimum frequency in Hz (1 GHz)
-FREQ_MAX = 10e9  # Maximum frequency in Hz (10 GHz)
-FREQ_SCALE = (FREQ_MAX - FREQ_MIN) / 1000  # Slider range scaling
+FREQ_MIN = 1_000_000_000  # Minimum frequency in Hz (1 GHz)
+FREQ_MAX = 10_000_000_000  # Maximum frequency in Hz (10 GHz)
+FREQ_STEP = 1_000_000  # Slider step in Hz (1 MHz), so slider values are MHz
+
+pyfftw.config.NUM_THREADS = FFT_THREADS
 
 hrf = HackRF()
 
+
+@nb.njit(cache=True, fastmath=True, boundscheck=False)
+def pack_iq(raw, window, out):
+    """Convert interleaved int8 I/Q to mean-removed, windowed complex samples.
+
+    Removing the block mean matches welch's default detrend="constant" and
+    keeps the HackRF's DC/LO-leakage spike out of bin 0.
+    """
+    n = out.shape[0]
+    mean_i = 0.0
+    mean_q = 0.0
+    for i in range(n):
+        mean_i += raw[2 * i]
+        mean_q += raw[2 * i + 1]
+    mean_i /= n
+    mean_q /= n
+    for i in range(n):
+        w = window[i]
+        out[i] = complex((raw[2 * i] - mean_i) * w, (raw[2 * i + 1] - mean_q) * w)
+
+
+class SpectrumWorker(QObject):
+    """Turn the HackRF sample stream into power spectra off the GUI thread."""
+
+    spectrum_ready = pyqtSignal()
+
+    def __init__(self, hackrf):
+        super().__init__()
+        self.hackrf = hackrf
+
+        # Spectrum analysis state, computed once for the fixed buffer size
+        self._win = np.hanning(BUFFER_SIZE + 1)[:-1].astype(np.float32)  # Periodic, as welch
+        self._win_norm = self._win.sum() ** 2  # Matches welch(scaling="spectrum")
+        # welch's one-sided (P_re + P_im) / 2 equals (|X[k]|^2 + |X[-k]|^2) / 2
+        self._power_scale = np.float32(1 / (2 * self._win_norm))
+        self._freqs = np.fft.fftfreq(BUFFER_SIZE, 1 / SAMPLE_RATE)
+        self._pos_slice = slice(0, BUFFER_SIZE // 2)  # Non-negative bins of the complex FFT
+        self._freqs_pos = self._freqs[self._pos_slice].astype(np.float32)  # Plotted as-is
+
+        # Scratch buffers reused by every spectrum update
+        self._fft_in = pyfftw.empty_aligned(BUFFER_SIZE, dtype="complex64")
+        self._fft_out = pyfftw.empty_aligned(BUFFER_SIZE, dtype="complex64")
+        self._power_buf = np.empty(BUFFER_SIZE // 2, dtype=np.float32)
+
+        # FFTW plan for the fixed-size transform, planned once up front
+        self._fft = pyfftw.FFTW(
+            self._fft_in, self._fft_out, flags=("FFTW_MEASURE",), threads=FFT_THREADS
+        )
+
+        # Window with the int8 -> float scale folded in, and a JIT warm-up
+        self._iq_win = self._win * IQ_SCALE
+        pack_iq(np.zeros(2 * BUFFER_SIZE, dtype=np.int8), self._iq_win, self._fft_in)
+
+        # Raw IQ double buffer: the RX callback fills the back buffer, then
+        # flips _active so the worker always reads a complete block
+        self._raw_bufs = (
+            np.empty(2 * BUFFER_SIZE, dtype=np.int8),
+            np.empty(2 * BUFFER_SIZE, dtype=np.int8),
+        )
+        self._active = 0
+        self._rx_ready = threading.Event()
+        self._stop = threading.Event()
+        self._paused = threading.Event()
+
+        # HackRF always streams interleaved I/Q, so bind the spectrum path once
+        self.compute_spectrum = self._compute_spectrum_iq
+
+        # Latest (freqs, power, max_power) frame; older frames are dropped, not queued
+        self.frames = deque(maxlen=1)
+
+    def run(self):
+        """Stream from the HackRF and compute spectra until stopped."""
+        interval = 1 / SWEEP_REFRESH_RATE
+        streaming = False
+        while not self._stop.is_set():
+            if self._paused.is_set():
+                if streaming:
+                    self.hackrf.stop_rx_mode()  # Free the USB bus while hidden
+                    streaming = False
+                self._stop.wait(interval)
+                continue
+            if not streaming:
+                self.hackrf.start_rx_mode(self._on_rx)
+                streaming = True
+            started = time.monotonic()
+            if not self._rx_ready.wait(interval):
+                continue  # No new samples yet
+            self._rx_ready.clear()
+            freqs, power = self.compute_spectrum(self._raw_bufs[self._active])
+            self.frames.append((freqs, power.copy(), float(power.max())))
+            self.spectrum_ready.emit()
+            # Cap the frame rate at SWEEP_REFRESH_RATE
+            self._stop.wait(max(0.0, interval - (time.monotonic() - started)))
+        if streaming:
+            self.hackrf.stop_rx_mode()
+
+    def stop(self):
+        """Ask the run loop to finish; safe to call from any thread."""
+        self._stop.set()
+
+    def pause(self):
+        """Stop streaming and computing spectra until resume() is called."""
+        self._paused.set()
+
+    def resume(self):
+        """Restart streaming after pause()."""
+        self._paused.clear()
+
+    def _on_rx(self, transfer):
+        """Copy the newest samples of a HackRF RX transfer (runs on the USB thread)."""
+        c = transfer.contents
+        raw = np.ctypeslib.as_array(c.buffer, shape=(c.valid_length,)).view(np.int8)
+        back = 1 - self._active
+        self._raw_bufs[back][:] = raw[-2 * BUFFER_SIZE:]
+        self._active = back  # Single writer, so a plain rebind is enough
+        self._rx_ready.set()
+        return 0
+
+    def _compute_spectrum_iq(self, samples):
+        """Compute the frequency spectrum of raw interleaved int8 I/Q samples."""
+        # Single windowed FFT over the IQ samples, all in place
+        pack_iq(samples, self._iq_win, self._fft_in)
+        self._fft()
+        power = self._power_buf
+        half = BUFFER_SIZE // 2
+        # Fold -f onto +f like the baseline's real/imag welch did, so the whole
+        # captured band is plotted and detected. Squared magnitude (no sqrt),
+        # normalisation and dB in one fused pass.
+        pos = self._fft_out[1:half]
+        neg = self._fft_out[:half:-1]  # X[-k] for k = 1 .. half - 1
+        ne.evaluate(
+            "10 * log10((p_re * p_re + p_im * p_im + n_re * n_re + n_im * n_im) * scale)",
+            local_dict={
+                "p_re": pos.real,
+                "p_im": pos.imag,
+                "n_re": neg.real,
+                "n_im": neg.imag,
+                "scale": self._power_scale,
+            },
+            out=power[1:],
+            casting="same_kind",
+        )
+        # welch does not double the DC bin of a one-sided spectrum
+        dc = self._fft_out[0]
+        power[0] = 10 * np.log10((dc.real * dc.real + dc.imag * dc.imag) * self._power_scale)
+        return self._freqs_pos, power
+
+
 class App(QMainWindow):
+    DETECTED_STYLE = "color: blue; font-size:30pt;"
+    NOT_DETECTED_STYLE = "color: green; font-size:30pt;"
+    PAUSED_STYLE = "color: gray; font-size:30pt;"
+
     def __init__(self):
         super().__init__()
 
@@ -41,27 +204,33 @@ class App(QMainWindow):
         self.graph_widget.setYRange(-120, 0)
         self.graph_widget.setLabel("left", "Amplitude", units="dB")
         self.graph_widget.setLabel("bottom", "Frequency", units="Hz")
+        self.graph_widget.setDownsampling(auto=True, mode="peak")
+        self.graph_widget.setClipToView(True)
         self.spectrum_line = self.graph_widget.plot(
-            [], [], pen=pg.mkPen("w", width=2)
+            [], [], pen=pg.mkPen("w", width=2), connect="all"
         )
 
         # Frequency Range Sliders
         self.freq_min_slider = QSlider(Qt.Orientation.Horizontal, self)
         self.freq_max_slider = QSlider(Qt.Orientation.Horizontal, self)
 
-        self.freq_min = FREQUENCY
-        self.freq_max = FREQ_MAX
+        # Selected range, centred on FREQUENCY so startup and retunes agree
+        self.freq_min = FREQUENCY - 1_000_000_000
+        self.freq_max = FREQUENCY + 1_000_000_000
 
-        self.freq_min_slider.setMinimum(0)
-        self.freq_min_slider.setMaximum(1000)  # Slider range
-        self.freq_min_slider.setValue(int((FREQUENCY - FREQ_MIN) / FREQ_SCALE))  # Default min frequency 1 GHz below center
+        self.freq_min_slider.setRange(FREQ_MIN // FREQ_STEP, FREQ_MAX // FREQ_STEP)
+        self.freq_min_slider.setValue(self.freq_min // FREQ_STEP)  # Default min frequency 1 GHz below center
         self.freq_min_slider.valueChanged.connect(self.on_freq_min_change)
 
-        self.freq_max_slider.setMinimum(0)
-        self.freq_max_slider.setMaximum(1000)  # Slider range
-        self.freq_max_slider.setValue(int((FREQUENCY + 1e9 - FREQ_MIN) / FREQ_SCALE))  # Default max frequency 1 GHz above center
+        self.freq_max_slider.setRange(FREQ_MIN // FREQ_STEP, FREQ_MAX // FREQ_STEP)
+        self.freq_max_slider.setValue(self.freq_max // FREQ_STEP)  # Default max frequency 1 GHz above center
         self.freq_max_slider.valueChanged.connect(self.on_freq_max_change)
 
+        # Retune once per slider drag rather than on every step
+        self._freq_debounce = QTimer(self)
+        self._freq_debounce.setSingleShot(True)
+        self._freq_debounce.timeout.connect(self.apply_freq_range)
+
         # Power Level Slider
         self.slider_label = QLabel("Power Level Threshold: 0 dB", self)
         self.slider = QSlider(Qt.Orientation.Horizontal, self)
@@ -70,9 +239,16 @@ class App(QMainWindow):
         self.slider.setValue(THRESHOLD_POWER)
         self.slider.valueChanged.connect(self.on_slider_change)
 
+        # Re-check detection only once the threshold slider settles
+        self._slider_debounce = QTimer(self)
+        self._slider_debounce.setSingleShot(True)
+        self._slider_debounce.timeout.connect(self.check_bandwidth)
+
         # Drone Status Label
         self.drone_status_label = QLabel("Drone Status: Not Detected", self)
-        self.drone_status_label.setStyleSheet("color: green; font-size: 30pt")
+        self.drone_status_label.setStyleSheet(self.NOT_DETECTED_STYLE)
+        self._last_state = None
+        self._above_threshold = False  # None means unknown: next check re-applies
 
         # Manual Check Button
         self.alert_button = QPushButton("Check for Drone", self)
@@ -82,18 +258,27 @@ class App(QMainWindow):
         self.sound_alert = QSoundEffect()
         self.sound_alert.setSource(QUrl.fromLocalFile("alert.wav"))
         self.sound_alert.setVolume(0.3)
+        # Loop while detected, since the alert is only started on a crossing
+        self.sound_alert.setLoopCount(QSoundEffect.Loop.Infinite.value)
 
         # HackRF Device Initialization
         self.hackrf = hrf
         self.hackrf.sample_rate = SAMPLE_RATE
-        self.hackrf.center_freq = FREQUENCY
+        self._center_freq_cache = None  # Last value written; never read back over USB
+        self.apply_freq_range()
         self.hackrf.lna_gain = 40  # Low Noise Amplifier gain
         self.hackrf.vga_gain = 20  # Variable Gain Amplifier gain
 
-        # Timer for Real-Time Updates
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_spectrum)
-        self.timer.start(int(1000 / SWEEP_REFRESH_RATE))  # Update interval in ms
+        # Acquisition and FFT run on a worker thread; frames come back queued
+        self._last_max_power = None  # No spectrum received yet
+        self.worker = SpectrumWorker(self.hackrf)
+        self.worker_thread = QThread(self)
+        self.worker.moveToThread(self.worker_thread)
+        self.worker_thread.started.connect(self.worker.run)
+        self.worker.spectrum_ready.connect(
+            self.update_spectrum, Qt.ConnectionType.QueuedConnection
+        )
+        self.worker_thread.start()
 
         # Logo Setup
         self.logo_label = QLabel(self)
@@ -125,94 +310,128 @@ class App(QMainWindow):
         container.setLayout(layout)
         self.setCentralWidget(container)
 
-    def check_bandwidth(self):
-        """Check the bandwidth of the signal and determine if a drone is detected."""
+    def check_bandwidth(self, max_power=None):
+        """Check the bandwidth of the signal and determine if a drone is detected.
+
+        The frame loop passes the max power it just computed; other callers
+        (threshold slider, manual check) fall back to analyze_signal().
+        """
         power_level = self.slider.value()
-        max_power = self.analyze_signal()
+        if max_power is None:
+            max_power = self.analyze_signal()
+            if max_power is None:
+                return  # Nothing to judge until the first frame arrives
+
+        now_above = max_power > power_level
+        if now_above == self._above_threshold:
+            return  # No threshold crossing, nothing to update
+        self._above_threshold = now_above
 
-        if max_power > power_level:
+        if now_above:
             self.drone_detected()
         else:
             self.drone_not_detected()
 
     def drone_detected(self):
         """Handle drone detection."""
-        self.drone_status_label.setText("Drone Status: Detected!")
-        self.drone_status_label.setStyleSheet("color: blue; font-size:30pt;")
+        if self._last_state != "detected":
+            self.drone_status_label.setText("Drone Status: Detected!")
+            self.drone_status_label.setStyleSheet(self.DETECTED_STYLE)
+            self._last_state = "detected"
         if not self.sound_alert.isPlaying():
             self.sound_alert.play()  # Play the alert sound if not already playing
 
     def drone_not_detected(self):
         """Handle the case when no drone is detected."""
-        self.drone_status_label.setText("Drone Status: Not Detected")
-        self.drone_status_label.setStyleSheet("color: green; font-size:30pt;")
+        if self._last_state != "not_detected":
+            self.drone_status_label.setText("Drone Status: Not Detected")
+            self.drone_status_label.setStyleSheet(self.NOT_DETECTED_STYLE)
+            self._last_state = "not_detected"
         # Stop the alert sound if it is playing
         if self.sound_alert.isPlaying():
             self.sound_alert.stop()
 
     def on_freq_min_change(self, value):
         """Handle frequency min slider value change."""
-        min_freq = FREQ_MIN + value * FREQ_SCALE
-        # Update your frequency range based on min_freq
-        self.hackrf.center_freq = (self.hackrf.center_freq + min_freq) / 2
+        self.freq_min = value * FREQ_STEP
+        self._freq_debounce.start(SLIDER_DEBOUNCE_MS)
 
     def on_freq_max_change(self, value):
         """Handle frequency max slider value change."""
-        max_freq = FREQ_MIN + value * FREQ_SCALE
-        # Update your frequency range based on max_freq
-        self.hackrf.center_freq = (self.hackrf.center_freq + max_freq) / 2
+        self.freq_max = value * FREQ_STEP
+        self._freq_debounce.start(SLIDER_DEBOUNCE_MS)
+
+    def apply_freq_range(self):
+        """Retune the HackRF to the centre of the selected frequency range."""
+        self.set_center_freq((self.freq_min + self.freq_max) // 2)  # Exact in integer Hz
+
+    def set_center_freq(self, freq):
+        """Tune the HackRF, skipping the retune if it is already on freq."""
+        if freq == self._center_freq_cache:
+            return
+        self.hackrf.center_freq = freq
+        self._center_freq_cache = freq
 
     def on_slider_change(self, value):
         """Handle slider value change."""
         self.slider_label.setText(f"Power Level Threshold: {value} dB")
-        self.check_bandwidth()
+        self._slider_debounce.start(SLIDER_DEBOUNCE_MS)
 
     def check_for_drone(self):
-        """Manually check for a drone."""
+        """Manually check for a drone, re-applying the state even without a crossing."""
+        self._above_threshold = None
+        self._last_state = None
         self.check_bandwidth()
 
     def update_spectrum(self):
-        """Update the spectrum plot with real-time data."""
-        samples = self.hackrf.read_samples(BUFFER_SIZE)
-        if samples is not None:
-            freqs, power = self.compute_spectrum(samples)
-            self.spectrum_line.setData(freqs, power)
-            self.check_bandwidth()
-
-    def compute_spectrum(self, samples):
-        """Compute the frequency spectrum of the signal."""
-        if np.iscomplexobj(samples):
-            # Compute power spectrum for real and imaginary parts separately
-            freqs, power_real = welch(
-                np.real(samples), SAMPLE_RATE, nperseg=BUFFER_SIZE, scaling="spectrum"
-            )
-            _, power_imag = welch(
-                np.imag(samples), SAMPLE_RATE, nperseg=BUFFER_SIZE, scaling="spectrum"
-            )
-            power = power_real + power_imag  # Combine power
-            power = 10 * np.log10(power / 2)  # Convert to dB
-        else:
-            freqs, power = welch(
-                samples, SAMPLE_RATE, nperseg=BUFFER_SIZE, scaling="spectrum"
-            )
-            power = 10 * np.log10(power)  # Convert to dB
-
-        # Only keep positive frequencies
-        positive_freqs = freqs[freqs >= 0]
-        positive_power = power[freqs >= 0]
-        
-        return positive_freqs, positive_power
+        """Update the spectrum plot with the latest frame from the worker."""
+        if not self.graph_widget.isVisible() or self.isMinimized():
+            self.pause_detection()  # Also covers minimizing without a hideEvent
+            return
+        try:
+            freqs, power, max_power = self.worker.frames.pop()
+        except IndexError:
+            return  # Already drawn by an earlier queued signal
+        self.spectrum_line.setData(freqs, power)
+        self._last_max_power = max_power
+        self.check_bandwidth(max_power)
 
     def analyze_signal(self):
-        """Analyze the signal to determine the max power level."""
-        samples = self.hackrf.read_samples(BUFFER_SIZE)
-        if samples is not None:
-            _, power = self.compute_spectrum(samples)
-            max_power = np.max(power)
-            return max_power
-        return -np.inf
+        """Return the max power level of the most recent spectrum.
+
+        Used outside the frame loop; the device is owned by the worker's
+        stream, so this reads the last frame rather than re-acquiring.
+        Returns None until the worker has delivered its first frame.
+        """
+        return self._last_max_power
+
+    def pause_detection(self):
+        """Silence the alert and forget the detection state while no frames arrive."""
+        if self._last_state == "paused":
+            return
+        if self.sound_alert.isPlaying():
+            self.sound_alert.stop()
+        self._above_threshold = None
+        self._last_max_power = None
+        self.drone_status_label.setText("Drone Status: Paused")
+        self.drone_status_label.setStyleSheet(self.PAUSED_STYLE)
+        self._last_state = "paused"
+
+    def hideEvent(self, event):
+        """Pause acquisition while the window is hidden or minimized."""
+        self.worker.pause()
+        self.pause_detection()
+        super().hideEvent(event)
+
+    def showEvent(self, event):
+        """Resume acquisition when the window is shown again."""
+        self.worker.resume()
+        super().showEvent(event)
 
     def closeEvent(self, event):
         """Clean up HackRF device on close."""
+        self.worker.stop()
+        self.worker_thread.quit()
+        self.worker_thread.wait()
         self.hackrf.close()
         event.accept()
\ No newline at end of file